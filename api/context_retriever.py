@@ -0,0 +1,159 @@
+# api/context_retriever.py
+
+import time
+import logging
+import numpy as np
+
+from api.match_engine import model
+
+logger = logging.getLogger(__name__)
+
+# --- Config ---
+RETRIEVAL_TOP_N = 8        # Records injected into the chat prompt per turn
+MAX_FIELD_CHARS = 160      # Per-field truncation inside the compact context
+ENCODE_BATCH_SIZE = 128
+EMBEDDING_DIM = model.get_sentence_embedding_dimension()
+
+
+# --- Record Helpers ---
+def _field(item, *keys, default="—"):
+    for key in keys:
+        value = item.get(key)
+        if value not in (None, "", "—"):
+            return str(value)
+    return default
+
+
+def _short(text, limit=MAX_FIELD_CHARS):
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit].rstrip() + "..."
+
+
+def record_search_text(item):
+    # Control text, regulation clause, gap and risk are what users ask about
+    return " | ".join([
+        _field(item, "Control Clause", "control", "Missing Clause", default=""),
+        _field(item, "Regulation", "regulation", default=""),
+        _field(item, "section", default=""),
+        _field(item, "matched_clause", default=""),
+        _field(item, "Gap", "gap", default=""),
+        _field(item, "risk", default=""),
+    ])
+
+
+def format_record(item, is_missing):
+    cid = _field(item, "Clause ID", "control_id", default="Unmatched clause" if is_missing else "Clause")
+    reg = _field(item, "Regulation", "regulation", default="Regulation")
+    status = "Missing" if is_missing else _field(item, "Match Type", "status")
+    score = _field(item, "Score", "score")
+    parts = [f"- `{cid}` in **{reg}** ({status}, Score: {score}): \"{_short(_field(item, 'Control Clause', 'control', 'Missing Clause', default=''))}\""]
+    regulation_clause = _field(item, "matched_clause")
+    gap = _field(item, "Gap", "gap")
+    risk = _field(item, "risk")
+    if regulation_clause != "—":
+        parts.append(f"Regulation clause: \"{_short(regulation_clause)}\"")
+    if gap != "—":
+        parts.append(f"Gap: {_short(gap)}")
+    if risk != "—":
+        parts.append(f"Risk: {_short(risk)}")
+    return " | ".join(parts)
+
+
+# --- Embeddings ---
+def embed_query(text):
+    return model.encode(text, convert_to_numpy=True, normalize_embeddings=True,
+                        show_progress_bar=False).astype(np.float32)
+
+
+def embed_records(items):
+    # Normalised (N, dim) float32 matrix; matching jobs call this as batches are written to the store
+    if not items:
+        return np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+    return model.encode(
+        [record_search_text(item) for item in items],
+        batch_size=ENCODE_BATCH_SIZE,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+        show_progress_bar=False
+    ).astype(np.float32)
+
+
+# --- Index ---
+class ResultIndex:
+    def __init__(self, keys, embeddings, fetch):
+        self.keys = keys                # Row keys (store seq numbers), aligned with embeddings
+        self.embeddings = embeddings    # Normalised (N, dim) float32 matrix
+        self.fetch = fetch              # keys -> {key: (item, is_missing)}, called for hits only
+
+    def __len__(self):
+        return len(self.keys)
+
+    def search(self, query, top_n=RETRIEVAL_TOP_N, query_vec=None):
+        # Pass query_vec when the caller already embedded the question (e.g. for the response cache)
+        if not len(self.keys) or not query.strip():
+            return []
+        if query_vec is None:
+            query_vec = embed_query(query)
+        scores = self.embeddings @ query_vec
+
+        top_n = min(top_n, len(scores))
+        top = np.argpartition(-scores, top_n - 1)[:top_n]
+        top = top[np.argsort(-scores[top])]
+        rows = self.fetch([int(self.keys[i]) for i in top])
+        return [
+            (*rows[int(self.keys[i])], float(scores[i]))
+            for i in top if int(self.keys[i]) in rows
+        ]
+
+
+def load_run_index(store, run_id):
+    # Embeddings are written by the matching job, so loading a run reads vectors and seq numbers only;
+    # row data stays in the store and is fetched for the hits of each query
+    start = time.perf_counter()
+    keys, blocks, stale = [], [], []
+    for batch in store.iter_embeddings(run_id):
+        block = np.zeros((len(batch), EMBEDDING_DIM), dtype=np.float32)
+        for n, (seq, _, blob) in enumerate(batch):
+            if blob is None:
+                stale.append((len(keys) + n, seq))
+            else:
+                block[n] = np.frombuffer(blob, dtype=np.float32)
+        keys.extend(seq for seq, _, _ in batch)
+        blocks.append(block)
+    embeddings = np.vstack(blocks) if blocks else np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+
+    if stale:
+        # Runs stored before embeddings were kept are encoded once and written back
+        rows = store.fetch_results(run_id, [seq for _, seq in stale])
+        fresh = embed_records([rows[seq][0] for _, seq in stale])
+        for (position, _), vec in zip(stale, fresh):
+            embeddings[position] = vec
+        store.set_embeddings(run_id, [(seq, vec.tobytes()) for (_, seq), vec in zip(stale, fresh)])
+        logger.info(f"[✓] Backfilled {len(stale)} retrieval embeddings for run {run_id}")
+
+    logger.info(f"[✓] Loaded {len(keys)} retrieval embeddings for run {run_id} in {time.perf_counter() - start:.2f}s")
+    return ResultIndex(
+        np.array(keys, dtype=np.int64), embeddings,
+        lambda seqs: store.fetch_results(run_id, seqs)
+    )
+
+
+# --- Retrieval ---
+def retrieve_records(index, query, top_n=RETRIEVAL_TOP_N, query_vec=None):
+    # Returns (hits, latency_ms)
+    start = time.perf_counter()
+    hits = index.search(query, top_n, query_vec)
+    return hits, (time.perf_counter() - start) * 1000
+
+
+def format_context(hits):
+    matched = [format_record(item, False) for item, is_missing, _ in hits if not is_missing]
+    missing = [format_record(item, True) for item, is_missing, _ in hits if is_missing]
+    lines = []
+    if matched:
+        lines.append("✅ Relevant Matched Clauses:")
+        lines.extend(matched)
+    if missing:
+        lines.append("❌ Relevant Missing Clauses:")
+        lines.extend(missing)
+    return "\n".join(lines)
@@ -0,0 +1,80 @@
+# api/conversation_manager.py
+
+import re
+from functools import lru_cache
+from typing import List, Dict
+
+# --- Config ---
+HISTORY_TOKEN_BUDGET = 2500    # Recent turns sent verbatim
+SUMMARY_TOKEN_BUDGET = 400     # Rolling summary of older turns
+SUMMARY_LINE_CHARS = 200       # Per-turn length inside the summary
+TOKEN_CACHE_SIZE = 8192
+
+
+# --- Token Accounting ---
+@lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def count_tokens(text: str) -> int:
+    # Cached per distinct message text, so each message is only tokenised once
+    return len(re.findall(r"\w+|[^\w\s]", text, re.UNICODE))
+
+def message_tokens(message: Dict) -> int:
+    return count_tokens(message.get("content", "") or "")
+
+def prompt_tokens(messages: List[Dict]) -> int:
+    return sum(message_tokens(m) for m in messages)
+
+
+# --- Rolling Summary ---
+@lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def condense_turn(role: str, content: str) -> str:
+    text = " ".join(content.split())
+    first_sentence = re.split(r"(?<=[.!?])\s", text, maxsplit=1)[0]
+    if len(first_sentence) > SUMMARY_LINE_CHARS:
+        first_sentence = first_sentence[:SUMMARY_LINE_CHARS].rstrip() + "..."
+    return f"- {role.title()}: {first_sentence}"
+
+def summarise_turns(turns: List[Dict], budget: int = SUMMARY_TOKEN_BUDGET) -> str:
+    lines, used = [], 0
+    # Newest condensed turns are kept first so the summary rolls forward
+    for m in reversed(turns):
+        line = condense_turn(m.get("role", "user"), m.get("content", "") or "")
+        cost = count_tokens(line)
+        if used + cost > budget:
+            break
+        lines.append(line)
+        used += cost
+    return "\n".join(reversed(lines))
+
+
+# --- Sliding Window ---
+def split_window(conversation: List[Dict], budget: int = HISTORY_TOKEN_BUDGET) -> int:
+    # Index of the first turn kept verbatim; the latest turn is always kept
+    used = 0
+    for i in range(len(conversation) - 1, -1, -1):
+        used += message_tokens(conversation[i])
+        if used > budget and i < len(conversation) - 1:
+            return i + 1
+    return 0
+
+def build_prompt(
+    system_messages: List[Dict],
+    conversation: List[Dict],
+    history_budget: int = HISTORY_TOKEN_BUDGET,
+    summary_budget: int = SUMMARY_TOKEN_BUDGET
+) -> List[Dict]:
+    # Pure function of its inputs, so the same history always yields the same prompt
+    conversation = [
+        {"role": m["role"], "content": m.get("content", "")}
+        for m in conversation if m.get("role") != "system"
+    ]
+    start = split_window(conversation, history_budget)
+
+    messages = [dict(m) for m in system_messages]
+    if start:
+        summary = summarise_turns(conversation[:start], summary_budget)
+        if summary:
+            messages.append({
+                "role": "system",
+                "content": f"Earlier conversation ({start} turns, condensed):\n{summary}"
+            })
+    return messages + conversation[start:]
@@ -14,6 +14,8 @@ from nltk.corpus import stopwords
 import fitz  # PyMuPDF
 from docx import Document
 
+from api.metrics import span, incr, observe
+
 # --- Logging Setup ---
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
@@ -129,8 +131,9 @@ def make_clause_dict(file_path, text, page_num, section, suffix):
     }
 
 def sanitize_clause(clause):
-    s = re.sub(r"[^A-Za-z0-9\s,.()\-–/]", "", clause.strip())
-    s = re.sub(r"\s+", " ", s)
+    with span("sanitize"):
+        s = re.sub(r"[^A-Za-z0-9\s,.()\-–/]", "", clause.strip())
+        s = re.sub(r"\s+", " ", s)
     return s
 
 def is_valid_clause(text):
@@ -179,7 +182,11 @@ def process_uploaded_file(uploaded_file, save_dir="data/uploads"):
     file_path = save_uploaded_file(uploaded_file, save_dir)
     logger.info(f"[✓] Saved: {file_path}")
 
-    clauses = extract_text(file_path)
+    ext = os.path.splitext(file_path)[1].lower().lstrip(".")
+    with span("parse", format=ext):
+        clauses = extract_text(file_path)
+    incr("documents_parsed", format=ext)
+    observe("clauses_per_document", len(clauses), format=ext)
     flat_text = "\n".join([c["text"] for c in clauses])
     save_text_and_metadata(flat_text, uploaded_file.name, save_dir="data/texts")
 
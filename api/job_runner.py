@@ -0,0 +1,213 @@
+# api/job_runner.py
+
+import io
+import time
+import uuid
+import logging
+import threading
+from collections import deque
+import streamlit as st
+
+from api.document_parser import process_uploaded_file
+from api.match_engine import process_and_match_multiple_docs, split_match_results
+from api.results_store import get_results_store
+from api.context_retriever import embed_records
+from api.metrics import set_gauge
+
+logger = logging.getLogger(__name__)
+
+# --- Config ---
+MAX_FINISHED_JOBS = 20    # Finished jobs kept in the registry per server process
+STORE_BATCH_ROWS = 500    # Buffered result rows written to the store per transaction
+STORE_FLUSH_SECONDS = 3.0 # ...or sooner, so partial results show up while LLM calls are slow
+RECENT_ROWS = 5           # Latest rows of each kind kept for the progress panel
+
+STAGES = ["parsed", "encoded", "scored", "analysed"]
+ACTIVE_STATUSES = ("queued", "running", "cancelling")
+
+
+# --- Upload Snapshots ---
+class UploadSnapshot(io.BytesIO):
+    # Copy of an uploaded file that stays valid after the widget reruns or is cleared
+    def __init__(self, uploaded_file):
+        super().__init__(uploaded_file.getvalue())
+        self.name = uploaded_file.name
+
+
+# --- Job ---
+class MatchingJob:
+    def __init__(self, control_docs, regulation_docs, store, on_finish=None):
+        self.job_id = uuid.uuid4().hex[:12]  # Also the run ID in the results store
+        self.store = store
+        self.on_finish = on_finish
+        self.control_docs = [UploadSnapshot(f) for f in control_docs]
+        self.regulation_docs = [UploadSnapshot(f) for f in regulation_docs]
+        self.status = "queued"
+        self.error = None
+        self.progress = {stage: [0, 0] for stage in STAGES}
+        self.counts = {"matched": 0, "missing": 0}
+        self.recent_matched, self.recent_missing = deque(maxlen=RECENT_ROWS), deque(maxlen=RECENT_ROWS)
+        self.pending_matched, self.pending_missing = [], []
+        self.next_seq = 0
+        self.last_flush = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    # --- State ---
+    def update(self, stage, done, total, batch=None):
+        with self.lock:
+            self.progress[stage] = [done, total]
+            if batch:
+                matched, missing = split_match_results(batch)
+                self.pending_matched.extend(matched)
+                self.pending_missing.extend(missing)
+                self.recent_matched.extend(matched)
+                self.recent_missing.extend(missing)
+                self.counts["matched"] += len(matched)
+                self.counts["missing"] += len(missing)
+        if batch:
+            pending = len(self.pending_matched) + len(self.pending_missing)
+            if pending >= STORE_BATCH_ROWS or time.time() - self.last_flush >= STORE_FLUSH_SECONDS:
+                self.flush()
+
+    def flush(self):
+        # Only the job thread writes, so the seq counter needs no extra locking
+        with self.lock:
+            matched, missing = self.pending_matched, self.pending_missing
+            self.pending_matched, self.pending_missing = [], []
+        self.last_flush = time.time()
+        if matched or missing:
+            # Retrieval vectors are computed here, off the UI thread, and stored with the rows
+            embeddings = embed_records(matched + missing)
+            self.store.append_results(
+                self.job_id, matched, missing, start_seq=self.next_seq,
+                embeddings=[vec.tobytes() for vec in embeddings]
+            )
+            with self.lock:
+                self.next_seq += len(matched) + len(missing)
+
+    def progress_snapshot(self):
+        # Cheap enough to poll every second: counts and the last few rows, never the full result lists
+        with self.lock:
+            return {
+                "job_id": self.job_id,
+                "status": self.status,
+                "error": self.error,
+                "progress": {stage: tuple(v) for stage, v in self.progress.items()},
+                "counts": dict(self.counts),
+                "stored": self.next_seq,    # Rows already readable from the results store
+                "recent_matched": list(self.recent_matched),
+                "recent_missing": list(self.recent_missing),
+                "elapsed": round((self.finished_at or time.time()) - (self.started_at or time.time()), 1),
+            }
+
+    def is_active(self):
+        with self.lock:
+            return self.status in ACTIVE_STATUSES
+
+    def set_status(self, status, error=None):
+        with self.lock:
+            self.status = status
+            if error is not None:
+                self.error = error
+
+    def cancel(self):
+        # Only queued or running jobs can be cancelled; a finished job never goes back to "cancelling"
+        with self.lock:
+            if self.status not in ("queued", "running"):
+                return
+            self.status = "cancelling"
+            self.cancel_event.set()
+
+    # --- Execution ---
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name=f"matching-{self.job_id}", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        self.started_at = time.time()
+        with self.lock:
+            if self.status == "queued":
+                self.status = "running"
+        try:
+            control_clauses, regulation_clauses = [], []
+            total_docs = len(self.control_docs) + len(self.regulation_docs)
+            for n, f in enumerate(self.control_docs + self.regulation_docs, start=1):
+                if self.cancel_event.is_set():
+                    break
+                clauses = process_uploaded_file(f)
+                if n <= len(self.control_docs):
+                    control_clauses += clauses
+                else:
+                    regulation_clauses += [{
+                        "text": c["text"],
+                        "regulation": f.name,
+                        "doc_name": c["doc_name"],
+                        "page_num": c["page_num"],
+                        "section": c["section"]
+                    } for c in clauses]
+                self.update("parsed", n, total_docs)
+
+            if not self.cancel_event.is_set():
+                # Results reach the store through the progress batches; nothing is kept on the job
+                process_and_match_multiple_docs(
+                    control_clauses, regulation_clauses,
+                    progress=self.update, cancel_event=self.cancel_event
+                )
+
+            self.set_status("cancelled" if self.cancel_event.is_set() else "done")
+        except Exception as e:
+            logger.exception(e)
+            self.set_status("failed", error=str(e))
+        finally:
+            self.finished_at = time.time()
+            self.control_docs, self.regulation_docs = [], []
+            try:
+                self.flush()
+            except Exception as e:
+                logger.exception(e)
+            self.store.finish_run(self.job_id, self.status)
+            if self.on_finish:
+                self.on_finish()
+            logger.info(f"[✓] Matching job {self.job_id} {self.status} in {self.finished_at - self.started_at:.2f}s")
+
+
+# --- Registry ---
+class JobRegistry:
+    def __init__(self, store):
+        self.jobs = {}
+        self.store = store
+        self.lock = threading.Lock()
+
+    def submit(self, control_docs, regulation_docs):
+        job = MatchingJob(control_docs, regulation_docs, self.store, on_finish=self.update_gauge)
+        self.store.create_run(job.job_id, [f.name for f in control_docs], [f.name for f in regulation_docs])
+        with self.lock:
+            self.jobs[job.job_id] = job
+            self._prune()
+        self.update_gauge()
+        job.start()
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def update_gauge(self):
+        with self.lock:
+            set_gauge("active_jobs", sum(j.is_active() for j in self.jobs.values()))
+
+    def _prune(self):
+        finished = [j for j in self.jobs.values() if not j.is_active()]
+        finished.sort(key=lambda j: j.finished_at or 0)
+        for job in finished[:max(len(finished) - MAX_FINISHED_JOBS, 0)]:
+            del self.jobs[job.job_id]
+
+
+@st.cache_resource(show_spinner=False)
+def get_job_registry():
+    # Lives for the server process, so jobs keep running across Streamlit reruns
+    return JobRegistry(get_results_store())
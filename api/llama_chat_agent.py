@@ -2,13 +2,23 @@
 
 # api/llama_chat_agent.py
 
-import re
 import os
+import logging
 import streamlit as st
 from typing import List, Dict, Generator, Union
 from dotenv import load_dotenv
 from openai import OpenAI
 
+from api.context_retriever import RETRIEVAL_TOP_N, load_run_index, retrieve_records, format_context, embed_query
+from api.results_store import get_results_store
+from api.metrics import span, incr, observe
+from api.conversation_manager import build_prompt, prompt_tokens
+from api.response_cache import (
+    context_fingerprint, get_response_cache, is_cacheable, normalize_question, stream_cached, stream_and_store
+)
+
+logger = logging.getLogger(__name__)
+
 # Load API key from .env
 load_dotenv()
 api_key = os.getenv("GROQ_API_KEY")
@@ -16,59 +26,94 @@ if not api_key:
     raise ValueError("🚨 GROQ_API_KEY not found. Check your .env file.")
 
 client = OpenAI(
-    base_url="https://api.groq.com/openai/v1",
+    base_url=os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1"),
     api_key=api_key
 )
 
 # --- Utility: Token Counting ---
-def approximate_token_count(text: str) -> int:
-    return len(re.findall(r"\w+|[^\w\s]", text, re.UNICODE))
-
 def dynamic_max_tokens(messages: List[Dict], model_max_tokens: int = 8192) -> int:
-    used = sum(approximate_token_count(m.get("content", "")) for m in messages)
-    return max(model_max_tokens - used - 150, 150)
-
-# --- Match Summary Context Injection ---
-def get_memory_context() -> Union[Dict, None]:
-    if not st.session_state.get("processed_data"):
+    return max(model_max_tokens - prompt_tokens(messages) - 150, 150)
+
+AUDIT_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": (
+        "You are in AUDIT MODE.\n"
+        "Only use uploaded clause content (matched or missing).\n"
+        "If unsure, respond: \"I cannot verify this based on uploaded documents.\"\n"
+        "Cite clause IDs and regulation names always. Do not assume or hallucinate."
+    )
+}
+
+# --- Retrieved Context Injection ---
+@st.cache_resource(show_spinner=False, max_entries=4)
+def get_run_index(run_id, version):
+    # Shared by every session viewing the run; version changes while a job is still writing rows
+    return load_run_index(get_results_store(), run_id)
+
+def get_result_index(run_id):
+    run = get_results_store().get_run(run_id)
+    if not run:
+        return None
+    return get_run_index(run_id, (run["status"], run["matched_count"] + run["missing_count"]))
+
+def latest_user_query(chat_history: List[Dict]) -> str:
+    for m in reversed(chat_history):
+        if m.get("role") == "user":
+            return m.get("content", "")
+    return ""
+
+def get_memory_context(query: str, top_n: int = RETRIEVAL_TOP_N, query_vec=None) -> Union[Dict, None]:
+    st.session_state.last_retrieval = None
+    index = get_result_index(st.session_state.get("run_id"))
+    if index is None:
         return None
 
-    matched = st.session_state["processed_data"].get("matched", [])[:5]
-    missing = st.session_state["processed_data"].get("missing", [])[:3]
-    context_lines = []
-
-    if matched:
-        context_lines.append("✅ Top Matched Clauses:")
-        for item in matched:
-            cid = item.get("control_id", "Clause")
-            reg = item.get("regulation", "Regulation")
-            score = item.get("score", "—")
-            clause_text = item.get("control", "")[:80]
-            context_lines.append(f"- `{cid}` in **{reg}** (Score: {score}): \"{clause_text}...\"")
-
-    if missing:
-        context_lines.append("❌ Missing Clauses:")
-        for item in missing:
-            clause_text = item.get("control", "")[:70]
-            gap = item.get("gap", "—")
-            context_lines.append(f"- \"{clause_text}...\"  (Gap: {gap})")
+    hits, latency_ms = retrieve_records(index, query, top_n, query_vec)
+    observe("retrieval_seconds", latency_ms / 1000)
+    st.session_state.last_retrieval = {"records": len(hits), "retrieval_ms": round(latency_ms, 1)}
+    if not hits:
+        return None
 
     return {
         "role": "system",
         "content": (
             "You are a legal compliance AI assistant. In Audit Mode, only use uploaded clause data.\n"
             "Always cite specific clause IDs and their regulation sources.\n\n"
-            "📄 Clause Summary:\n" + "\n".join(context_lines)
+            "📄 Clauses relevant to this question:\n" + format_context(hits)
         )
     }
 
-def inject_context_once(chat_history: List[Dict]) -> List[Dict]:
-    if not st.session_state.get("context_injected", False):
-        context = get_memory_context()
-        if context:
-            st.session_state.context_injected = True
-            return [context] + [m for m in chat_history if m["role"] != "system"]
-    return chat_history
+def build_messages(chat_history: List[Dict], audit_mode: bool = True, query_vec=None) -> List[Dict]:
+    # Fresh list every turn: the caller's history is never mutated
+    conversation = [m for m in chat_history if m["role"] != "system"]
+    system_messages = [AUDIT_SYSTEM_MESSAGE] if audit_mode else []
+    context = get_memory_context(latest_user_query(conversation), query_vec=query_vec)
+    if context:
+        system_messages.append(context)
+    return build_prompt(system_messages, conversation)
+
+def get_context_key(audit_mode: bool, model: str) -> str:
+    # Hashing the results is done once per result set, not once per turn
+    processed_data = st.session_state.get("processed_data")
+    cached = st.session_state.get("context_fingerprint")
+    if cached and cached[0] is processed_data and cached[1] == (audit_mode, model):
+        return cached[2]
+    key = context_fingerprint(processed_data, audit_mode, model)
+    st.session_state.context_fingerprint = (processed_data, (audit_mode, model), key)
+    return key
+
+def record_turn_stats(token_count: int, cache_hit: Union[str, None] = None, max_history: int = 50):
+    if cache_hit:
+        stats = {"records": 0, "retrieval_ms": 0.0}
+    else:
+        stats = dict(st.session_state.get("last_retrieval") or {"records": 0, "retrieval_ms": 0.0})
+    stats["prompt_tokens"] = token_count
+    stats["cache"] = cache_hit
+    if not cache_hit:
+        observe("chat_prompt_tokens", token_count)
+    history = (st.session_state.get("chat_turn_stats") or []) + [stats]
+    st.session_state.chat_turn_stats = history[-max_history:]
+    logger.info(f"[✓] Chat turn: {stats['records']} records retrieved in {stats['retrieval_ms']}ms, ~{token_count} prompt tokens, cache: {cache_hit or 'miss'}")
 
 # --- Chat Function ---
 def ask_llama(
@@ -81,20 +126,23 @@ def ask_llama(
     if isinstance(messages, str):
         messages = [{"role": "user", "content": messages}]
 
-    messages = inject_context_once(messages)
-
-    if audit_mode:
-        system_msg = {
-            "role": "system",
-            "content": (
-                "You are in AUDIT MODE.\n"
-                "Only use uploaded clause content (matched or missing).\n"
-                "If unsure, respond: \"I cannot verify this based on uploaded documents.\"\n"
-                "Cite clause IDs and regulation names always. Do not assume or hallucinate."
-            )
-        }
-        messages.insert(0, system_msg)
-
+    question = latest_user_query(messages)
+    question_vec = None
+    use_cache = is_cacheable(question, messages[:-1])
+    if use_cache:
+        cache = get_response_cache()
+        context_key = get_context_key(audit_mode, model)
+        cached_reply, hit, question_vec = cache.lookup(context_key, question)
+        if cached_reply is not None:
+            record_turn_stats(0, cache_hit=hit)
+            return stream_cached(cached_reply) if stream else cached_reply
+
+    # One embedding per turn, shared by the cache lookup, retrieval and cache store
+    if question_vec is None and question.strip():
+        question_vec = embed_query(normalize_question(question))
+    messages = build_messages(messages, audit_mode, question_vec)
+
+    record_turn_stats(prompt_tokens(messages))
     max_tokens = dynamic_max_tokens(messages)
 
     params = {
@@ -106,16 +154,27 @@ def ask_llama(
     }
 
     try:
+        incr("chat_requests", model=model)
         if stream:
-            response = client.chat.completions.create(**params)
+            # Measures time until the stream opens; token streaming continues in the caller
+            with span("chat_llm", model=model, stream="true"):
+                response = client.chat.completions.create(**params)
+            if use_cache:
+                return stream_and_store(
+                    response, lambda reply: cache.store(context_key, question, reply, embedding=question_vec)
+                )
             return (chunk.choices[0].delta.content or "" for chunk in response)
         else:
-            response = client.chat.completions.create(**params)
+            with span("chat_llm", model=model, stream="false"):
+                response = client.chat.completions.create(**params)
             reply = response.choices[0].message.content.strip()
             if response.choices[0].finish_reason != "stop":
                 reply += "\n\n⚠️ Truncated due to token limit."
+            elif use_cache:
+                cache.store(context_key, question, reply, embedding=question_vec)
             return reply
     except Exception as e:
+        incr("chat_errors", model=model, status=str(getattr(e, "status_code", None) or type(e).__name__))
         return (
             "⚠️ The system was unable to analyze this fully due to token limit or API failure.\n"
             f"Error: {str(e)}\n"
@@ -0,0 +1,169 @@
+# api/metrics.py
+
+import os
+import json
+import time
+import threading
+from collections import deque
+
+# --- Config ---
+ENABLED = os.getenv("CHECKMATE_METRICS", "0") == "1"
+SAMPLE_WINDOW = 2048    # Most recent observations kept per histogram for percentiles
+PREFIX = "checkmate"
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_histograms = {}
+
+
+def set_enabled(enabled):
+    global ENABLED
+    ENABLED = bool(enabled)
+
+def is_enabled():
+    return ENABLED
+
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+
+# --- Recording ---
+def incr(name, value=1, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def set_gauge(name, value, **labels):
+    if not ENABLED:
+        return
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+def observe(name, value, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = {"count": 0, "sum": 0.0, "samples": deque(maxlen=SAMPLE_WINDOW)}
+        hist["count"] += 1
+        hist["sum"] += value
+        hist["samples"].append(value)
+
+
+# --- Spans ---
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(f"{self.name}_seconds", time.perf_counter() - self.start, **self.labels)
+        if exc_type is not None:
+            incr(f"{self.name}_failures", **self.labels)
+        return False
+
+
+def span(name, **labels):
+    # Disabled instrumentation returns a shared no-op, so the hot path pays one flag check
+    return Span(name, labels) if ENABLED else _NOOP_SPAN
+
+
+# --- Export ---
+def _percentile(sorted_values, q):
+    # Linear interpolation between closest ranks, so p50 of [1, 2] is 1.5
+    if not sorted_values:
+        return 0.0
+    pos = q * (len(sorted_values) - 1)
+    lower = int(pos)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (pos - lower)
+
+def snapshot():
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        histograms = {k: (h["count"], h["sum"], sorted(h["samples"])) for k, h in _histograms.items()}
+
+    return {
+        "enabled": ENABLED,
+        "sample_window": SAMPLE_WINDOW,     # p50/p95/max cover only the latest samples; count/sum are lifetime
+        "counters": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(counters.items())],
+        "gauges": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(gauges.items())],
+        "histograms": [{
+            "name": n,
+            "labels": dict(l),
+            "count": count,
+            "sum": round(total, 6),
+            "p50": round(_percentile(samples, 0.50), 6),
+            "p95": round(_percentile(samples, 0.95), 6),
+            "max": round(samples[-1], 6) if samples else 0.0,
+        } for (n, l), (count, total, samples) in sorted(histograms.items())],
+    }
+
+def to_json(indent=2):
+    return json.dumps(snapshot(), indent=indent)
+
+def _escape_label(value):
+    # Text exposition format: backslash, double quote and newline must be escaped in label values
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def to_prometheus():
+    def fmt_labels(labels, extra=None):
+        items = list(labels.items()) + list((extra or {}).items())
+        if not items:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in items) + "}"
+
+    snap = snapshot()
+    lines, typed = [], set()
+
+    def declare(metric, kind, help_text=None):
+        if metric not in typed:
+            typed.add(metric)
+            if help_text:
+                lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {kind}")
+
+    for c in snap["counters"]:
+        metric = f"{PREFIX}_{c['name']}_total"
+        declare(metric, "counter")
+        lines.append(f"{metric}{fmt_labels(c['labels'])} {c['value']}")
+    for g in snap["gauges"]:
+        metric = f"{PREFIX}_{g['name']}"
+        declare(metric, "gauge")
+        lines.append(f"{metric}{fmt_labels(g['labels'])} {g['value']}")
+    for h in snap["histograms"]:
+        metric = f"{PREFIX}_{h['name']}"
+        declare(metric, "summary",
+                f"Quantiles over the last {SAMPLE_WINDOW} observations; _sum and _count are lifetime totals.")
+        lines.append(f"{metric}{fmt_labels(h['labels'], {'quantile': '0.5'})} {h['p50']}")
+        lines.append(f"{metric}{fmt_labels(h['labels'], {'quantile': '0.95'})} {h['p95']}")
+        lines.append(f"{metric}_sum{fmt_labels(h['labels'])} {h['sum']}")
+        lines.append(f"{metric}_count{fmt_labels(h['labels'])} {h['count']}")
+    return "\n".join(lines) + "\n"
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
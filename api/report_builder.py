@@ -1,110 +1,214 @@
 import io
-import pandas as pd
+import csv
 from datetime import datetime
+from itertools import islice
 
-def clean_field(val):
-    if isinstance(val, str) and any(err in val for err in ["LLaMA Error", "Too Many Requests", "Payload Too Large"]):
-        return "⚠️ Unable to generate reasoning (AI overload)"
-    return val if val else "—"
+import pandas as pd
+import xlsxwriter
 
-def generate_final_csv_report(matched_controls, missing_controls, chat_history=None, audit_mode=True):
-    output = io.BytesIO()
+from api.metrics import span, incr
+
+# --- Config ---
+EXPORT_CHUNK_SIZE = 5000  # Rows mapped and written per batch
+
+AI_ERROR_MARKERS = ["LLaMA Error", "Too Many Requests", "Payload Too Large"]
+AI_OVERLOAD_MESSAGE = "⚠️ Unable to generate reasoning (AI overload)"
+
+SCORE_COLUMN = "Match Score (%)"
+REWRITE_COLUMN = "Suggested Rewrite for Better Compliance"
+
+# Report column -> source keys, in lookup order (dashboard keys first, raw matcher keys second)
+COLUMN_SOURCES = {
+    "Clause ID": ("Clause ID", "control_id"),
+    "Control Clause": ("Control Clause", "control", "Missing Clause"),
+    "Match Type": ("Match Type", "status"),
+    "Regulation": ("Regulation", "regulation"),
+    SCORE_COLUMN: ("Score", "score"),
+    "Overlap Terms": ("Overlap Terms", "overlap"),
+    "Semantic Gap Analysis": ("Gap", "gap"),
+    "AI Reasoning": ("Reasoning", "reason"),
+    REWRITE_COLUMN: ("rewrite",),
+    "Associated Risks": ("risk",),
+    "Potential Fines": ("fine",),
+}
+REPORT_COLUMNS = list(COLUMN_SOURCES)
+
+REWRITE_COLUMNS = [
+    "Clause ID", "Control Clause", REWRITE_COLUMN,
+    "AI Reasoning", "Associated Risks", "Potential Fines"
+]
+CROSS_COLUMNS = {
+    "Clause ID": "Clause ID",
+    "Appears In Regulation": "Regulation",
+    "Overlap Terms": "Overlap Terms",
+    "Gaps Noted": "Semantic Gap Analysis",
+}
+
+REPORT_FORMATS = {
+    "xlsx": ("Compliance_Report.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": ("Compliance_Report.csv", "text/csv"),
+    "parquet": ("Compliance_Report.parquet", "application/vnd.apache.parquet"),
+}
+
+
+# --- Column Mapping ---
+def map_report_frame(records, is_missing=False):
+    df = pd.DataFrame.from_records(records)
+
+    # Resolve each report column against the available keys once, then map whole columns
+    columns = {}
+    for column, keys in COLUMN_SOURCES.items():
+        key = next((k for k in keys if k in df.columns), None)
+        if column == SCORE_COLUMN:
+            columns[column] = pd.to_numeric(df[key], errors="coerce").fillna(0.0) if key else 0.0
+        else:
+            columns[column] = df[key].fillna("—").astype(str) if key else "—"
+
+    mapped = pd.DataFrame(columns, index=df.index, columns=REPORT_COLUMNS)
+    if is_missing:
+        mapped["Match Type"] = "Unmatched"
+
+    reasoning = mapped["AI Reasoning"]
+    overloaded = reasoning.str.contains("|".join(AI_ERROR_MARKERS), regex=True)
+    mapped["AI Reasoning"] = reasoning.mask(overloaded, AI_OVERLOAD_MESSAGE).replace("", "—")
+    return mapped
+
+
+def iter_report_frames(matched_controls, missing_controls, chunk_size=EXPORT_CHUNK_SIZE):
+    # Yields (is_missing, frame) batches so only one chunk is ever materialised
+    for records, is_missing in ((matched_controls, False), (missing_controls, True)):
+        rows = iter(records or [])
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            yield is_missing, map_report_frame(chunk, is_missing=is_missing)
+
+
+# --- Excel Export ---
+def write_excel_report(matched_controls, missing_controls, output, chat_history=None,
+                       audit_mode=True, chunk_size=EXPORT_CHUNK_SIZE):
+    workbook = xlsxwriter.Workbook(output, {
+        "constant_memory": True,
+        "strings_to_formulas": False,
+        "strings_to_urls": False,
+    })
+    header_format = workbook.add_format({"bold": True, "border": 1})
+
+    def add_sheet(name, header):
+        sheet = workbook.add_worksheet(name)
+        sheet.write_row(0, 0, header, header_format)
+        return sheet
 
-    def safe_series(df, *possible_keys, default="—"):
-        for key in possible_keys:
-            if key in df.columns:
-                return df[key]
-        return pd.Series([default] * len(df))
-
-    def preprocess(df_raw, is_missing=False):
-        if not df_raw:
-            return pd.DataFrame(columns=[
-                "Clause ID", "Control Clause", "Match Type", "Regulation", "Match Score (%)",
-                "Overlap Terms", "Semantic Gap Analysis", "AI Reasoning",
-                "Suggested Rewrite for Better Compliance", "Associated Risks", "Potential Fines"
-            ])
-
-        df = pd.DataFrame(df_raw).copy()
-
-        df["Clause ID"] = safe_series(df, "Clause ID", "control_id")
-        df["Control Clause"] = safe_series(df, "Control Clause", "control", "Missing Clause")
-        df["Match Type"] = "Unmatched" if is_missing else safe_series(df, "Match Type", "status", default="—")
-        df["Regulation"] = safe_series(df, "Regulation", "regulation")
-        df["Match Score (%)"] = safe_series(df, "Score", "score", default=0.0)
-        df["Overlap Terms"] = safe_series(df, "Overlap Terms", "overlap")
-        df["Semantic Gap Analysis"] = safe_series(df, "Gap", "gap")
-
-        df["AI Reasoning"] = safe_series(df, "Reasoning", "reason").apply(clean_field)
-        df["Suggested Rewrite for Better Compliance"] = safe_series(df, "rewrite")
-        df["Associated Risks"] = safe_series(df, "risk")
-        df["Potential Fines"] = safe_series(df, "fine")
-
-        return df[[ 
-            "Clause ID",
-            "Control Clause",
-            "Match Type",
-            "Regulation",
-            "Match Score (%)",
-            "Overlap Terms",
-            "Semantic Gap Analysis",
-            "AI Reasoning",
-            "Suggested Rewrite for Better Compliance",
-            "Associated Risks",
-            "Potential Fines"
-        ]]
-
-    # --- Sheet 1: Full Summary ---
-    df_matched = preprocess(matched_controls, is_missing=False)
-    df_missing = preprocess(missing_controls, is_missing=True)
-    df_compliance = pd.concat([df_matched, df_missing], ignore_index=True)
+    # Sheets are created up front so they keep their order while rows stream in
+    compliance_sheet = add_sheet("Compliance Report", REPORT_COLUMNS)
+    chat_sheet = add_sheet("Chatbot History", ["Role", "Message", "Timestamp"])
+    rewrite_sheet = add_sheet("Rewritten Controls", REWRITE_COLUMNS)
+    cross_sheet = add_sheet("Cross-Document Analysis", list(CROSS_COLUMNS))
+    session_sheet = add_sheet("Session Info", ["Field", "Value"])
+
+    # --- Sheets 1, 3, 4: Compliance rows, rewrites and cross-regulation mapping ---
+    compliance_row, rewrite_row, cross_row = 1, 1, 1
+    counts = {False: 0, True: 0}
+    for is_missing, frame in iter_report_frames(matched_controls, missing_controls, chunk_size):
+        counts[is_missing] += len(frame)
+        for values in frame.itertuples(index=False, name=None):
+            compliance_sheet.write_row(compliance_row, 0, values)
+            compliance_row += 1
+
+        if is_missing:
+            continue
+
+        rewrites = frame.loc[frame[REWRITE_COLUMN] != "—", REWRITE_COLUMNS]
+        for values in rewrites.itertuples(index=False, name=None):
+            rewrite_sheet.write_row(rewrite_row, 0, values)
+            rewrite_row += 1
+
+        for values in frame[list(CROSS_COLUMNS.values())].itertuples(index=False, name=None):
+            cross_sheet.write_row(cross_row, 0, values)
+            cross_row += 1
 
     # --- Sheet 2: Chat History ---
-    chat_rows = []
-    if chat_history:
-        for msg in chat_history:
-            chat_rows.append({
-                "Role": msg.get("role", "system").title(),
-                "Message": msg.get("content", "").replace("\n", " ").strip(),
-                "Timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            })
-    df_chat = pd.DataFrame(chat_rows, columns=["Role", "Message", "Timestamp"])
-
-    # --- Sheet 3: Rewrites ---
-    df_rewrites = df_matched[
-        df_matched["Suggested Rewrite for Better Compliance"] != "—"
-    ][[
-        "Clause ID", "Control Clause", "Suggested Rewrite for Better Compliance",
-        "AI Reasoning", "Associated Risks", "Potential Fines"
-    ]].copy()
-
-    # --- Sheet 4: Cross Regulation ---
-    cross_data = []
-    for row in matched_controls:
-        cross_data.append({
-            "Clause ID": row.get("control_id", "—"),
-            "Appears In Regulation": row.get("regulation", "—"),
-            "Overlap Terms": row.get("overlap", "—"),
-            "Gaps Noted": row.get("gap", "—")
-        })
-    df_cross = pd.DataFrame(cross_data, columns=[
-        "Clause ID", "Appears In Regulation", "Overlap Terms", "Gaps Noted"
-    ])
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for row, msg in enumerate(chat_history or [], start=1):
+        chat_sheet.write_row(row, 0, [
+            msg.get("role", "system").title(),
+            msg.get("content", "").replace("\n", " ").strip(),
+            timestamp
+        ])
 
     # --- Sheet 5: Audit Mode Info ---
-    session_info = pd.DataFrame([
-        {"Field": "Audit Mode", "Value": "ON" if audit_mode else "OFF"},
-        {"Field": "Generated On", "Value": datetime.now().strftime("%Y-%m-%d %H:%M:%S")},
-        {"Field": "Matched Clauses", "Value": len(df_matched)},
-        {"Field": "Missing Clauses", "Value": len(df_missing)}
+    session_rows = [
+        ("Audit Mode", "ON" if audit_mode else "OFF"),
+        ("Generated On", timestamp),
+        ("Matched Clauses", counts[False]),
+        ("Missing Clauses", counts[True]),
+    ]
+    for row, values in enumerate(session_rows, start=1):
+        session_sheet.write_row(row, 0, values)
+
+    workbook.close()
+    return output
+
+
+# --- CSV Export ---
+def write_csv_report(matched_controls, missing_controls, output, chunk_size=EXPORT_CHUNK_SIZE):
+    # Accepts a path, a text handle or a binary handle such as BytesIO
+    if isinstance(output, str):
+        with open(output, "w", encoding="utf-8", newline="") as f:
+            write_csv_report(matched_controls, missing_controls, f, chunk_size)
+        return output
+
+    binary = not isinstance(output, io.TextIOBase)
+    handle = io.TextIOWrapper(output, encoding="utf-8", newline="") if binary else output
+    try:
+        writer = csv.writer(handle)
+        writer.writerow(REPORT_COLUMNS)
+        for _, frame in iter_report_frames(matched_controls, missing_controls, chunk_size):
+            writer.writerows(frame.itertuples(index=False, name=None))
+        handle.flush()
+    finally:
+        if binary:
+            handle.detach()
+    return output
+
+
+# --- Parquet Export ---
+def write_parquet_report(matched_controls, missing_controls, output, chunk_size=EXPORT_CHUNK_SIZE):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("❌ Parquet export requires pyarrow. Install it with `pip install pyarrow`.") from e
+
+    schema = pa.schema([
+        (column, pa.float64() if column == SCORE_COLUMN else pa.string())
+        for column in REPORT_COLUMNS
     ])
+    writer = pq.ParquetWriter(output, schema)
+    try:
+        for _, frame in iter_report_frames(matched_controls, missing_controls, chunk_size):
+            writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+    finally:
+        writer.close()
+    return output
+
 
-    # --- Write to Excel ---
-    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-        df_compliance.to_excel(writer, sheet_name="Compliance Report", index=False)
-        df_chat.to_excel(writer, sheet_name="Chatbot History", index=False)
-        df_rewrites.to_excel(writer, sheet_name="Rewritten Controls", index=False)
-        df_cross.to_excel(writer, sheet_name="Cross-Document Analysis", index=False)
-        session_info.to_excel(writer, sheet_name="Session Info", index=False)
+# --- Entry Points ---
+def generate_report(matched_controls, missing_controls, fmt="xlsx", chat_history=None, audit_mode=True,
+                    chunk_size=EXPORT_CHUNK_SIZE):
+    if fmt not in REPORT_FORMATS:
+        raise ValueError(f"❌ Unsupported report format: {fmt}")
+
+    output = io.BytesIO()
+    with span("report", format=fmt):
+        if fmt == "xlsx":
+            write_excel_report(matched_controls, missing_controls, output, chat_history, audit_mode, chunk_size)
+        elif fmt == "csv":
+            write_csv_report(matched_controls, missing_controls, output, chunk_size)
+        elif fmt == "parquet":
+            write_parquet_report(matched_controls, missing_controls, output, chunk_size)
+    incr("reports_generated", format=fmt)
 
     output.seek(0)
     return output
@@ -0,0 +1,159 @@
+# api/response_cache.py
+
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+import streamlit as st
+
+from api.context_retriever import embed_query
+from api.metrics import incr
+
+# --- Config ---
+CACHE_MAX_ENTRIES = 512
+CACHE_TTL_SECONDS = 6 * 60 * 60
+SIMILARITY_THRESHOLD = 0.92     # Cosine similarity for a semantic hit
+MIN_CACHE_QUESTION_WORDS = 3    # Short follow-ups ("why?") depend on history, so skip them
+STREAM_CHUNK_WORDS = 8
+
+# Words that point back at an earlier reply ("rewrite it stronger", "explain that clause")
+REFERRING_WORDS = {
+    "it", "its", "this", "that", "these", "those", "they", "them", "their", "above", "previous",
+    "earlier", "same", "again", "more", "further", "instead", "also", "else", "last", "one"
+}
+IDENTIFIER_PATTERN = re.compile(r"[A-Za-z0-9]+(?:[-_./][A-Za-z0-9]+)*")
+
+
+# --- Keys ---
+def normalize_question(question):
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", question.lower())).strip()
+
+def context_fingerprint(processed_data, audit_mode, model_name):
+    payload = json.dumps(processed_data or {}, sort_keys=True, default=str, ensure_ascii=False)
+    digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    return f"{digest}:{'audit' if audit_mode else 'open'}:{model_name}"
+
+def question_identifiers(question):
+    # Clause IDs, numbers and acronyms (CTRL-P1-C3, 72, GDPR) must match exactly for a semantic hit
+    tokens = IDENTIFIER_PATTERN.findall(question)
+    return frozenset(
+        t.lower() for t in tokens
+        if any(c.isdigit() for c in t) or (len(t) > 1 and t.isupper())
+    )
+
+def depends_on_history(question, chat_history):
+    # A question can lean on an earlier answer only if one exists in this conversation
+    if not any(m.get("role") == "assistant" for m in chat_history):
+        return False
+    words = set(normalize_question(question).split())
+    return bool(words & REFERRING_WORDS) or not question_identifiers(question)
+
+def is_cacheable(question, chat_history=()):
+    if len(normalize_question(question).split()) < MIN_CACHE_QUESTION_WORDS:
+        return False
+    return not depends_on_history(question, chat_history)
+
+
+# --- Cache ---
+class ResponseCache:
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, threshold=SIMILARITY_THRESHOLD):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.entries = OrderedDict()    # key -> entry dict, oldest first
+        self.lock = threading.Lock()
+
+    def _key(self, context_key, question):
+        return hashlib.sha256(f"{context_key}\n{normalize_question(question)}".encode("utf-8")).hexdigest()
+
+    def embed(self, question):
+        return embed_query(normalize_question(question))
+
+    def _evict_expired(self, now):
+        for key in [k for k, e in self.entries.items() if e["expires_at"] <= now]:
+            del self.entries[key]
+
+    def lookup(self, context_key, question):
+        # Returns (response, "exact" | "semantic" | None, question embedding or None);
+        # on a miss the embedding is reused for retrieval and store(), so a turn encodes once
+        now = time.time()
+        key = self._key(context_key, question)
+        with self.lock:
+            self._evict_expired(now)
+            entry = self.entries.get(key)
+            if entry:
+                self.entries.move_to_end(key)
+                incr("response_cache_lookups", result="exact")
+                return entry["response"], "exact", None
+            identifiers = question_identifiers(question)
+            candidates = [
+                (k, e) for k, e in self.entries.items()
+                if e["context_key"] == context_key and e["identifiers"] == identifiers
+            ]
+
+        query_vec = None
+        if candidates:
+            query_vec = self.embed(question)
+            scores = np.stack([e["embedding"] for _, e in candidates]) @ query_vec
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                best_key, best_entry = candidates[best]
+                with self.lock:
+                    if best_key in self.entries:
+                        self.entries.move_to_end(best_key)
+                incr("response_cache_lookups", result="semantic")
+                return best_entry["response"], "semantic", query_vec
+
+        incr("response_cache_lookups", result="miss")
+        return None, None, query_vec
+
+    def store(self, context_key, question, response, ttl=None, embedding=None):
+        entry = {
+            "context_key": context_key,
+            "question": question,
+            "identifiers": question_identifiers(question),
+            "embedding": self.embed(question) if embedding is None else embedding,
+            "response": response,
+            "expires_at": time.time() + (self.ttl if ttl is None else ttl),
+        }
+        key = self._key(context_key, question)
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+@st.cache_resource(show_spinner=False)
+def get_response_cache():
+    # One cache per server process, shared by every session viewing the same results
+    return ResponseCache()
+
+
+# --- Streaming Helpers ---
+def stream_cached(response, chunk_words=STREAM_CHUNK_WORDS):
+    words = re.split(r"(\s+)", response)
+    step = chunk_words * 2
+    for i in range(0, len(words), step):
+        yield "".join(words[i:i + step])
+
+def stream_and_store(response, on_complete):
+    # Yields text deltas from an OpenAI stream; only a fully consumed stream that stopped
+    # normally (not on the token limit) is handed to on_complete for caching
+    parts, finish_reason = [], None
+    for chunk in response:
+        choice = chunk.choices[0]
+        finish_reason = choice.finish_reason or finish_reason
+        text = choice.delta.content or ""
+        parts.append(text)
+        yield text
+    reply = "".join(parts)
+    if finish_reason == "stop" and reply.strip():
+        on_complete(reply)
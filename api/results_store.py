@@ -0,0 +1,271 @@
+# api/results_store.py
+
+import os
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+import streamlit as st
+
+# --- Config ---
+DEFAULT_DB_PATH = os.path.join("data", "results.db")
+PAGE_SIZE = 50
+RUNS_PAGE_SIZE = 20
+ITER_BATCH_SIZE = 5000
+
+SORTABLE_COLUMNS = ["score", "regulation", "status", "clause_id", "seq"]
+FILTERABLE_COLUMNS = ["regulation", "status"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    finished_at TEXT,
+    status TEXT NOT NULL,
+    control_docs TEXT,
+    regulation_docs TEXT,
+    matched_count INTEGER DEFAULT 0,
+    missing_count INTEGER DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    clause_id TEXT,
+    control_text TEXT,
+    status TEXT,
+    regulation TEXT,
+    score REAL,
+    data TEXT NOT NULL,
+    embedding BLOB
+);
+CREATE INDEX IF NOT EXISTS idx_results_run_kind ON results(run_id, kind, seq);
+CREATE INDEX IF NOT EXISTS idx_results_run_seq ON results(run_id, seq);
+CREATE INDEX IF NOT EXISTS idx_results_run_regulation ON results(run_id, regulation);
+CREATE INDEX IF NOT EXISTS idx_results_run_status ON results(run_id, status);
+CREATE INDEX IF NOT EXISTS idx_results_run_score ON results(run_id, score);
+CREATE INDEX IF NOT EXISTS idx_results_run_text ON results(run_id, control_text);
+"""
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _result_row(run_id, seq, item, kind, embedding=None):
+    # Indexed columns are pulled out of the dashboard-shaped row; the full row is kept as JSON
+    is_missing = kind == "missing"
+    return (
+        run_id,
+        seq,
+        kind,
+        item.get("Clause ID", "—"),
+        item.get("Missing Clause" if is_missing else "Control Clause", "—"),
+        "Unmatched" if is_missing else item.get("Match Type", "—"),
+        item.get("Regulation", "—"),
+        float(item.get("Score") or 0.0),
+        json.dumps(item, ensure_ascii=False, default=str),
+        embedding,
+    )
+
+
+class ResultsStore:
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self.connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            # Databases created before retrieval embeddings were stored lack the column
+            columns = {r["name"] for r in conn.execute("PRAGMA table_info(results)")}
+            if "embedding" not in columns:
+                conn.execute("ALTER TABLE results ADD COLUMN embedding BLOB")
+
+    @contextmanager
+    def connect(self):
+        # One short-lived connection per operation keeps the store safe to use from job threads
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys=ON")
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    # --- Writes ---
+    def create_run(self, run_id, control_docs=(), regulation_docs=()):
+        with self.connect() as conn:
+            conn.execute(
+                "INSERT INTO runs (run_id, created_at, status, control_docs, regulation_docs) VALUES (?, ?, ?, ?, ?)",
+                (run_id, _now(), "running", json.dumps(list(control_docs)), json.dumps(list(regulation_docs)))
+            )
+
+    def append_results(self, run_id, matched=(), missing=(), start_seq=0, embeddings=None):
+        # The writer owns the run's seq counter and passes the next value in, so no MAX(seq) scan
+        # is needed; callers should buffer rows and append real batches, one transaction each.
+        # embeddings: optional retrieval vectors as bytes, one per row of matched + missing
+        seq = start_seq
+        embeddings = list(embeddings) if embeddings is not None else [None] * (len(matched) + len(missing))
+        with self.lock, self.connect() as conn:
+            rows = [_result_row(run_id, seq + n, item, "matched", embeddings[n]) for n, item in enumerate(matched)]
+            seq += len(rows)
+            rows += [
+                _result_row(run_id, seq + n, item, "missing", embeddings[len(matched) + n])
+                for n, item in enumerate(missing)
+            ]
+            conn.executemany(
+                "INSERT INTO results (run_id, seq, kind, clause_id, control_text, status, regulation, score, data, embedding) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.execute(
+                "UPDATE runs SET matched_count = matched_count + ?, missing_count = missing_count + ? WHERE run_id = ?",
+                (len(matched), len(missing), run_id)
+            )
+
+    def set_embeddings(self, run_id, items):
+        # items: (seq, embedding bytes) pairs, used to backfill runs stored before embeddings were kept
+        with self.lock, self.connect() as conn:
+            conn.executemany(
+                "UPDATE results SET embedding = ? WHERE run_id = ? AND seq = ?",
+                [(embedding, run_id, seq) for seq, embedding in items]
+            )
+
+    def finish_run(self, run_id, status):
+        with self.connect() as conn:
+            conn.execute("UPDATE runs SET status = ?, finished_at = ? WHERE run_id = ?", (status, _now(), run_id))
+
+    def delete_run(self, run_id):
+        with self.connect() as conn:
+            conn.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+
+    # --- Reads ---
+    def list_runs(self, limit=RUNS_PAGE_SIZE, offset=0):
+        with self.connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM runs ORDER BY created_at DESC, run_id LIMIT ? OFFSET ?", (limit, offset)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def count_runs(self):
+        with self.connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+    def get_run(self, run_id):
+        with self.connect() as conn:
+            row = conn.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        return dict(row) if row else None
+
+    def distinct_values(self, run_id, column):
+        if column not in FILTERABLE_COLUMNS:
+            raise ValueError(f"❌ Cannot filter on column: {column}")
+        with self.connect() as conn:
+            rows = conn.execute(
+                f"SELECT DISTINCT {column} FROM results WHERE run_id = ? ORDER BY {column}", (run_id,)
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def query_results(self, run_id, kind=None, regulation=None, status=None, min_score=None, search=None,
+                      order_by="score", descending=True, limit=PAGE_SIZE, offset=0):
+        # Returns (page of dashboard-shaped rows, total matching rows)
+        if order_by not in SORTABLE_COLUMNS:
+            raise ValueError(f"❌ Cannot sort on column: {order_by}")
+
+        clauses, params = ["run_id = ?"], [run_id]
+        for column, value in (("kind", kind), ("regulation", regulation), ("status", status)):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if min_score is not None:
+            clauses.append("score >= ?")
+            params.append(min_score)
+        if search:
+            clauses.append("control_text LIKE ?")
+            params.append(f"%{search}%")
+        where = " AND ".join(clauses)
+
+        with self.connect() as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM results WHERE {where}", params).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT data FROM results WHERE {where} "
+                f"ORDER BY {order_by} {'DESC' if descending else 'ASC'}, seq LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+        return [json.loads(r["data"]) for r in rows], total
+
+    def iter_results(self, run_id, kind, batch_size=ITER_BATCH_SIZE):
+        # Keyset pagination on seq, so exporters and indexers never hold the whole run
+        last_seq = -1
+        while True:
+            with self.connect() as conn:
+                rows = conn.execute(
+                    "SELECT seq, data FROM results WHERE run_id = ? AND kind = ? AND seq > ? ORDER BY seq LIMIT ?",
+                    (run_id, kind, last_seq, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            for r in rows:
+                yield json.loads(r["data"])
+            last_seq = rows[-1]["seq"]
+
+    def iter_embeddings(self, run_id, batch_size=ITER_BATCH_SIZE):
+        # Yields batches of (seq, is_missing, embedding bytes or None) without loading row data
+        last_seq = -1
+        while True:
+            with self.connect() as conn:
+                rows = conn.execute(
+                    "SELECT seq, kind, embedding FROM results WHERE run_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                    (run_id, last_seq, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            yield [(r["seq"], r["kind"] == "missing", r["embedding"]) for r in rows]
+            last_seq = rows[-1]["seq"]
+
+    def fetch_results(self, run_id, seqs):
+        # Returns {seq: (dashboard-shaped row, is_missing)} for a handful of rows, e.g. retrieval hits
+        seqs = list(seqs)
+        if not seqs:
+            return {}
+        with self.connect() as conn:
+            rows = conn.execute(
+                f"SELECT seq, kind, data FROM results WHERE run_id = ? AND seq IN ({','.join('?' * len(seqs))})",
+                [run_id] + seqs
+            ).fetchall()
+        return {r["seq"]: (json.loads(r["data"]), r["kind"] == "missing") for r in rows}
+
+    def status_summary(self, run_id):
+        with self.connect() as conn:
+            rows = conn.execute(
+                "SELECT status, COUNT(*) AS n, AVG(score) AS avg_score FROM results WHERE run_id = ? GROUP BY status",
+                (run_id,)
+            ).fetchall()
+        return {r["status"]: {"count": r["n"], "avg_score": round(r["avg_score"] or 0.0, 3)} for r in rows}
+
+    def run_summary(self, run_id, top_n=5):
+        # Small session-sized view of a run: best matches, first gaps and per-status counts
+        matched, _ = self.query_results(run_id, kind="matched", order_by="score", limit=top_n)
+        missing, _ = self.query_results(run_id, kind="missing", order_by="seq", descending=False, limit=top_n)
+        return {"run_id": run_id, "matched": matched, "missing": missing, "counts": self.status_summary(run_id)}
+
+    def compare_runs(self, base_run_id, new_run_id, limit=PAGE_SIZE):
+        # Clauses whose best match status changed between two runs, matched on control text
+        with self.connect() as conn:
+            rows = conn.execute(
+                "SELECT b.control_text AS clause, b.regulation AS old_regulation, n.regulation AS new_regulation, "
+                "b.status AS old_status, n.status AS new_status, b.score AS old_score, n.score AS new_score "
+                "FROM results b JOIN results n ON n.run_id = ? AND n.control_text = b.control_text "
+                "WHERE b.run_id = ? AND (b.status != n.status OR b.regulation != n.regulation) "
+                "ORDER BY ABS(n.score - b.score) DESC LIMIT ?",
+                (new_run_id, base_run_id, limit)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+
+@st.cache_resource(show_spinner=False)
+def get_results_store(path=DEFAULT_DB_PATH):
+    return ResultsStore(path)
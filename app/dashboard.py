@@ -8,10 +8,11 @@ import streamlit as st
 sys.path.append(str(Path(__file__).parent.parent.resolve()))
 
 # App modules
-from api.document_parser import process_uploaded_file
-from api.match_engine import process_and_match_multiple_docs
-from api.report_builder import generate_final_csv_report
+from api.job_runner import get_job_registry
+from api.results_store import get_results_store, SORTABLE_COLUMNS, PAGE_SIZE, RUNS_PAGE_SIZE
+from api.report_builder import generate_report, REPORT_FORMATS
 from api.llama_chat_agent import ask_llama, get_flashcard_prompts_from_context
+from api import metrics
 
 # Logging
 logging.basicConfig(level=logging.INFO)
@@ -24,7 +25,8 @@ st.set_page_config(page_title="Compliance Intelligence Engine", layout="wide")
 def init_session():
     st.session_state.setdefault("chat_history", [])
     st.session_state.setdefault("processed_data", None)
-    st.session_state.setdefault("context_injected", False)
+    st.session_state.setdefault("job_id", None)
+    st.session_state.setdefault("run_id", None)
 
 init_session()
 
@@ -59,76 +61,146 @@ regulation_docs = st.sidebar.file_uploader("Upload Regulations", type=["pdf", "d
 st.sidebar.markdown("---")
 audit_mode_enabled = st.sidebar.toggle("🛡️ Enable Audit Mode", value=True, help="Strict mode: Only use uploaded content, no assumptions.")
 
-if not control_docs or not regulation_docs:
+# 🩺 Diagnostics
+with st.sidebar.expander("🩺 Diagnostics", expanded=False):
+    # The flag is process-wide, so it is only written when the user flips the toggle
+    st.session_state["metrics_enabled"] = metrics.is_enabled()
+    st.toggle(
+        "Collect pipeline metrics", key="metrics_enabled",
+        on_change=lambda: metrics.set_enabled(st.session_state.metrics_enabled)
+    )
+    snap = metrics.snapshot()
+    if snap["histograms"]:
+        st.markdown("**Latencies & sizes** (p50 / p95)")
+        st.dataframe([
+            {"Metric": h["name"], "Labels": ", ".join(f"{k}={v}" for k, v in h["labels"].items()),
+             "Count": h["count"], "p50": h["p50"], "p95": h["p95"], "Max": h["max"]}
+            for h in snap["histograms"]
+        ], use_container_width=True)
+    if snap["counters"] or snap["gauges"]:
+        st.markdown("**Counters & gauges**")
+        st.dataframe([
+            {"Metric": m["name"], "Labels": ", ".join(f"{k}={v}" for k, v in m["labels"].items()), "Value": m["value"]}
+            for m in snap["counters"] + snap["gauges"]
+        ], use_container_width=True)
+    st.download_button("⬇️ Prometheus", metrics.to_prometheus(), file_name="checkmate_metrics.prom", mime="text/plain")
+    st.download_button("⬇️ JSON", metrics.to_json(), file_name="checkmate_metrics.json", mime="application/json")
+    if st.button("Reset metrics"):
+        metrics.reset()
+
+job_registry = get_job_registry()
+results_store = get_results_store()
+
+def load_run(run_id):
+    # The session only keeps a small summary; everything else is paged from the results store
+    st.session_state.run_id = run_id
+    st.session_state.processed_data = results_store.run_summary(run_id) if run_id else None
+    st.session_state.context_fingerprint = None
+
+# 🕘 Previous Runs (stored runs stay reachable after a reset or a restart)
+with st.sidebar.expander("🕘 Previous Runs", expanded=False):
+    run_pages = max((results_store.count_runs() + RUNS_PAGE_SIZE - 1) // RUNS_PAGE_SIZE, 1)
+    runs_page = st.number_input(f"Runs page (of {run_pages})", min_value=1, max_value=run_pages, value=1)
+    runs = results_store.list_runs(offset=(runs_page - 1) * RUNS_PAGE_SIZE)
+    typed_run_id = st.text_input("…or run ID").strip()
+    if typed_run_id and not results_store.get_run(typed_run_id):
+        st.warning(f"No stored run `{typed_run_id}`.")
+        typed_run_id = ""
+    if runs or typed_run_id:
+        picked = typed_run_id or st.selectbox(
+            "Stored run",
+            [r["run_id"] for r in runs],
+            format_func=lambda rid: next(f"{r['created_at']} · {r['status']} · {rid}" for r in runs if r["run_id"] == rid)
+        )
+        # A run that is still being written can't be loaded or deleted until its job finishes
+        picked_job = job_registry.get(picked)
+        picked_active = bool(picked_job and picked_job.is_active())
+        col1, col2 = st.columns(2)
+        if col1.button("📂 Load run", disabled=picked_active):
+            load_run(picked)
+            st.rerun()
+        if col2.button("🗑️ Delete run", disabled=picked_active):
+            results_store.delete_run(picked)
+            if st.session_state.get("run_id") == picked:
+                load_run(None)
+            st.rerun()
+    else:
+        st.caption("No stored runs yet.")
+
+# 🔍 Run Matching (background job)
+uploads_ready = bool(control_docs and regulation_docs)
+if not uploads_ready:
     st.sidebar.warning("Please upload both control and regulatory documents.")
-    st.stop()
 
-# 🔍 Run Matching
-@st.cache_data(show_spinner=False)
-def run_matching():
-    try:
-        control_clauses, regulation_clauses = [], []
-
-        for f in control_docs:
-            control_clauses += process_uploaded_file(f)
-
-        for f in regulation_docs:
-            clauses = process_uploaded_file(f)
-            regulation_clauses += [{"text": c["text"], "regulation": f.name} for c in clauses]
-
-        results = process_and_match_multiple_docs(control_clauses, regulation_clauses)
-        matched, missing = [], []
-
-        for r in results:
-            score = r.get("score", 0.0)
-            if r["status"] == "Unmatched":
-                missing.append({
-                    "Missing Clause": r.get("control", "—"),
-                    "Score": score,
-                    "gap": r.get("gap", "—"),
-                    "reason": r.get("reason", "—"),
-                    "Regulation": r.get("regulation", "—"),
-                    "rewrite": r.get("rewrite", "—"),
-                    "risk": r.get("risk", "—"),
-                    "fine": r.get("fine", "—")
-                })
-            else:
-                matched.append({
-                    "Clause ID": r.get("control_id", "—"),
-                    "Control Clause": r.get("control", "—"),
-                    "Match Type": r.get("status", "—"),
-                    "Score": score,
-                    "Regulation": r.get("regulation", "—"),
-                    "Overlap Terms": r.get("overlap", "—"),
-                    "Gap": r.get("gap", "—"),
-                    "Reasoning": r.get("reason", "—"),
-                    "rewrite": r.get("rewrite", "—"),
-                    "risk": r.get("risk", "—"),
-                    "fine": r.get("fine", "—")
-                })
-
-        return {"matched": matched, "missing": missing}
-    except Exception as e:
-        logger.exception(e)
+if st.sidebar.button("🔍 Run Compliance Matching", disabled=not uploads_ready):
+    active = job_registry.get(st.session_state.get("job_id"))
+    if active and active.is_active():
+        active.cancel()
+    st.session_state.job_id = job_registry.submit(control_docs, regulation_docs).job_id
+    st.session_state.job_rows_seen = 0
+    load_run(st.session_state.job_id)
+
+@st.fragment(run_every=1.0)
+def show_job_progress(job):
+    snap = job.progress_snapshot()
+    if snap["status"] not in ("queued", "running", "cancelling"):
+        # Finished: stop polling and let the full page publish the results
+        st.rerun()
+    if snap["stored"] != st.session_state.get("job_rows_seen"):
+        # A batch was flushed: summary, explorer, report and chat all follow the partial run
+        st.session_state.job_rows_seen = snap["stored"]
+        load_run(snap["job_id"])
+        st.rerun()
+
+    st.markdown(f"### ⏳ Matching job `{snap['job_id']}` — {snap['status']} ({snap['elapsed']}s)")
+    for stage, (done, total) in snap["progress"].items():
+        st.progress(done / total if total else 0.0, text=f"{stage.title()}: {done}/{total}")
+    if st.button("⛔ Cancel Matching"):
+        job.cancel()
+    if snap["counts"]["matched"] or snap["counts"]["missing"]:
+        st.caption(f"Partial results: {snap['counts']['matched']} matched, {snap['counts']['missing']} missing so far")
+        for m in snap["recent_matched"][-3:]:
+            st.success(f"✅ `{m['Clause ID']}` matched in **{m['Regulation']}** (Score: {round(m['Score'], 2)})")
+        for m in snap["recent_missing"][-2:]:
+            st.warning(f"⚠️ Missing: “{m['Missing Clause'][:60]}...” — Gap: **{m['gap']}**")
+
+job = job_registry.get(st.session_state.get("job_id"))
+if job and job.is_active():
+    # The polling fragment only exists while the job runs
+    show_job_progress(job)
+elif job:
+    snap = job.progress_snapshot()
+    if st.session_state.get("job_applied") != snap["job_id"]:
+        # Publish the finished (or partial, if cancelled) results once
+        st.session_state.job_applied = snap["job_id"]
+        load_run(snap["job_id"])
+        if snap["status"] == "failed":
+            logger.error(snap["error"])
+    if snap["status"] == "cancelled":
+        st.info(f"⛔ Matching cancelled after {snap['elapsed']}s — showing partial results.")
+    elif snap["status"] == "failed":
         st.error("❌ AI Matching failed.")
-        return {"matched": [], "missing": []}
 
-if st.sidebar.button("🔍 Run Compliance Matching"):
-    with st.spinner("Running AI-based clause analysis..."):
-        st.session_state.processed_data = run_matching()
+report_format = st.sidebar.selectbox("📄 Report Format", list(REPORT_FORMATS), format_func=str.upper)
 
-if st.sidebar.button("📥 Download CSV Report"):
+if st.sidebar.button("📥 Download Report"):
     try:
-        report = generate_final_csv_report(
-            st.session_state.get("processed_data", {}).get("matched", []),
-            st.session_state.get("processed_data", {}).get("missing", []),
-            chat_history=st.session_state.get("chat_history", [])
+        run_id = st.session_state.get("run_id")
+        if not run_id:
+            raise ValueError("No matching run loaded")
+        report = generate_report(
+            results_store.iter_results(run_id, "matched"),
+            results_store.iter_results(run_id, "missing"),
+            fmt=report_format,
+            chat_history=st.session_state.get("chat_history", []),
+            audit_mode=audit_mode_enabled
         )
+        file_name, mime = REPORT_FORMATS[report_format]
         st.sidebar.download_button(
             label="📊 Export Compliance Report",
             data=report,
-            file_name="Compliance_Report.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            file_name=file_name,
+            mime=mime
         )
     except Exception as e:
         logger.error(e)
@@ -137,6 +209,18 @@ if st.sidebar.button("📥 Download CSV Report"):
 # 🧠 Summary UI
 if st.session_state.get("processed_data"):
     st.markdown("## 📊 Compliance Summary")
+    run = results_store.get_run(st.session_state.get("run_id")) or {}
+    if run:
+        st.caption(
+            f"Run `{run['run_id']}` · {run['created_at']} · {run['status']} · "
+            f"{run['matched_count']} matched, {run['missing_count']} missing"
+        )
+    counts = st.session_state["processed_data"].get("counts", {})
+    if counts:
+        cols = st.columns(len(counts))
+        for col, (status, info) in zip(cols, counts.items()):
+            col.metric(status, info["count"], help=f"Average score: {info['avg_score']}")
+
     top_matches = st.session_state["processed_data"].get("matched", [])[:3]
     top_misses = st.session_state["processed_data"].get("missing", [])[:2]
 
@@ -162,6 +246,47 @@ if st.session_state.get("processed_data"):
                 st.error("❌ Chat failed.")
                 logger.error(e)
 
+# 🗂️ Results Explorer
+if st.session_state.get("run_id"):
+    run_id = st.session_state.run_id
+    with st.expander("🗂️ Explore All Results", expanded=False):
+        col1, col2, col3, col4 = st.columns(4)
+        kind = col1.selectbox("Type", ["All", "matched", "missing"])
+        regulation = col2.selectbox("Regulation", ["All"] + results_store.distinct_values(run_id, "regulation"))
+        status = col3.selectbox("Status", ["All"] + results_store.distinct_values(run_id, "status"))
+        order_by = col4.selectbox("Sort by", SORTABLE_COLUMNS)
+        search = st.text_input("Search clause text")
+        descending = st.checkbox("Descending", value=True)
+
+        filters = {
+            "kind": None if kind == "All" else kind,
+            "regulation": None if regulation == "All" else regulation,
+            "status": None if status == "All" else status,
+            "search": search or None,
+        }
+        _, total = results_store.query_results(run_id, limit=0, **filters)
+        pages = max((total + PAGE_SIZE - 1) // PAGE_SIZE, 1)
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1)
+        rows, _ = results_store.query_results(
+            run_id, order_by=order_by, descending=descending,
+            limit=PAGE_SIZE, offset=(page - 1) * PAGE_SIZE, **filters
+        )
+        st.caption(f"{total} results")
+        st.dataframe(rows, use_container_width=True)
+
+    with st.expander("🕘 Run History", expanded=False):
+        st.dataframe(runs, use_container_width=True)
+        others = [r for r in runs if r["run_id"] != run_id]
+        if others:
+            base = st.selectbox(
+                "Compare current run against",
+                [r["run_id"] for r in others],
+                format_func=lambda rid: next(f"{r['created_at']} · {rid}" for r in others if r["run_id"] == rid)
+            )
+            changes = results_store.compare_runs(base, run_id)
+            st.caption(f"{len(changes)} clauses changed status or regulation")
+            st.dataframe(changes, use_container_width=True)
+
 # 💬 Chatbox
 st.markdown("## 💬 Chat with Compliance Assistant")
 with st.form("chat_form", clear_on_submit=True):
@@ -187,8 +312,19 @@ for msg in st.session_state.chat_history:
     with st.chat_message(msg["role"]):
         st.markdown(msg["content"])
 
+if st.session_state.get("chat_turn_stats"):
+    last_turn = st.session_state.chat_turn_stats[-1]
+    st.caption(
+        f"🔎 {last_turn['records']} clauses retrieved in {last_turn['retrieval_ms']} ms · "
+        f"~{last_turn['prompt_tokens']} prompt tokens"
+        + (f" · ⚡ {last_turn['cache']} cache hit" if last_turn.get("cache") else "")
+    )
+
 # ♻️ Reset
 if st.sidebar.button("🧹 Reset All"):
-    for key in ["chat_history", "processed_data", "context_injected"]:
+    active = job_registry.get(st.session_state.get("job_id"))
+    if active:
+        active.cancel()
+    for key in ["chat_history", "processed_data", "chat_turn_stats", "context_fingerprint", "job_id", "job_applied", "run_id"]:
         st.session_state[key] = [] if "history" in key else None
     st.rerun()
@@ -0,0 +1,112 @@
+# benchmarks/bench_report_export.py
+#
+# Time and peak-memory benchmark for report export on large synthetic result sets.
+# Usage: python benchmarks/bench_report_export.py --rows 200000 --formats xlsx csv parquet
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+# Add project root to sys.path
+sys.path.append(str(Path(__file__).parent.parent.resolve()))
+
+from api.report_builder import (
+    EXPORT_CHUNK_SIZE,
+    write_excel_report,
+    write_csv_report,
+    write_parquet_report,
+)
+
+WRITERS = {
+    "xlsx": lambda m, x, path, size: write_excel_report(m, x, path, chunk_size=size),
+    "csv": lambda m, x, path, size: write_csv_report(m, x, path, chunk_size=size),
+    "parquet": lambda m, x, path, size: write_parquet_report(m, x, path, chunk_size=size),
+}
+
+
+# --- Synthetic Results (same shape as dashboard.run_matching) ---
+def make_results(rows, missing_ratio=0.2, seed=7):
+    rng = random.Random(seed)
+    statuses = ["Strong Match", "Partial Match", "Weak Match"]
+    regulations = ["GDPR.pdf", "RBI.pdf", "ISO27001.docx", "DPDP.txt"]
+    matched, missing = [], []
+    for i in range(rows):
+        text = f"Control {i} requires encryption of personal data at rest and periodic access review."
+        score = round(rng.random(), 3)
+        if rng.random() < missing_ratio:
+            missing.append({
+                "Missing Clause": text,
+                "Score": score,
+                "gap": "No retention period defined",
+                "reason": "—",
+                "Regulation": rng.choice(regulations),
+                "rewrite": "—",
+                "risk": "—",
+                "fine": "—"
+            })
+        else:
+            matched.append({
+                "Clause ID": f"CONTROL-S{i}",
+                "Control Clause": text,
+                "Match Type": rng.choice(statuses),
+                "Score": score,
+                "Regulation": rng.choice(regulations),
+                "Overlap Terms": "encryption, personal data",
+                "Gap": "Key rotation not covered",
+                "Reasoning": "[LLaMA Error: 429 Too Many Requests]" if i % 50 == 0 else "Partial overlap on encryption.",
+                "rewrite": "Encrypt personal data at rest and rotate keys annually." if i % 3 == 0 else "—",
+                "risk": "Data breach exposure",
+                "fine": "Medium"
+            })
+    return matched, missing
+
+
+def run_benchmark(rows, formats, chunk_size):
+    matched, missing = make_results(rows)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in formats:
+            path = os.path.join(tmp, f"report.{fmt}")
+            tracemalloc.start()
+            start = time.perf_counter()
+            WRITERS[fmt](matched, missing, path, chunk_size)
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            results.append({
+                "format": fmt,
+                "rows": rows,
+                "chunk_size": chunk_size,
+                "seconds": round(elapsed, 3),
+                "peak_mb": round(peak / 1024 / 1024, 2),
+                "file_mb": round(os.path.getsize(path) / 1024 / 1024, 2),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark compliance report export.")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+    parser.add_argument("--formats", nargs="+", choices=list(WRITERS), default=list(WRITERS))
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.rows, args.formats, args.chunk_size)
+    for r in results:
+        print(f"{r['format']:>8}  {r['rows']:>8} rows  {r['seconds']:>8.3f}s  "
+              f"peak {r['peak_mb']:>8.2f} MB  file {r['file_mb']:>7.2f} MB")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
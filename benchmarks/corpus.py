@@ -0,0 +1,111 @@
+# benchmarks/corpus.py
+#
+# Synthetic control and regulation corpora in every format the parser accepts.
+# Usage: python benchmarks/corpus.py --controls 500 --regulations 2000 --out data/bench_corpus
+
+import os
+import random
+import argparse
+
+import pandas as pd
+import fitz  # PyMuPDF
+from docx import Document
+
+FORMATS = ["pdf", "docx", "csv", "xlsx"]
+
+SUBJECTS = [
+    "The organisation", "The data controller", "The bank", "Each business unit", "The IT security team",
+    "The processor", "The compliance officer", "Third-party vendors", "System administrators", "The board"
+]
+ACTIONS = [
+    "shall encrypt", "must review", "shall retain", "must restrict access to", "shall log and monitor",
+    "must obtain consent before processing", "shall report breaches involving", "must classify",
+    "shall back up", "must securely dispose of"
+]
+OBJECTS = [
+    "personal data", "customer account records", "payment card information", "audit logs",
+    "privileged credentials", "health records", "employee information", "transaction data",
+    "cross-border data transfers", "backup media"
+]
+QUALIFIERS = [
+    "at least annually", "within 72 hours", "using approved cryptographic standards",
+    "in line with the retention schedule", "on a quarterly basis", "before onboarding",
+    "with documented approval", "through role-based access controls", "across all environments",
+    "as defined in the information security policy"
+]
+REGULATIONS = ["GDPR", "RBI", "ISO27001", "DPDP"]
+
+
+# --- Clause Generation ---
+def make_clause(rng):
+    return f"{rng.choice(SUBJECTS)} {rng.choice(ACTIONS)} {rng.choice(OBJECTS)} {rng.choice(QUALIFIERS)}."
+
+def make_clauses(n, seed):
+    rng = random.Random(seed)
+    return [make_clause(rng) for _ in range(n)]
+
+
+# --- Writers ---
+def write_pdf(path, clauses, per_page=40):
+    doc = fitz.open()
+    for start in range(0, len(clauses), per_page):
+        page = doc.new_page()
+        y = 50
+        for clause in clauses[start:start + per_page]:
+            page.insert_text((40, y), clause, fontsize=8)
+            y += 18
+    doc.save(path)
+    doc.close()
+
+def write_docx(path, clauses, per_section=25):
+    doc = Document()
+    for i, clause in enumerate(clauses):
+        if i % per_section == 0:
+            doc.add_heading(f"Section {i // per_section + 1}", level=1)
+        doc.add_paragraph(clause)
+    doc.save(path)
+
+def write_csv(path, clauses):
+    pd.DataFrame({"clause_text": clauses}).to_csv(path, index=False)
+
+def write_xlsx(path, clauses):
+    pd.DataFrame({"clause_text": clauses}).to_excel(path, index=False)
+
+WRITERS = {"pdf": write_pdf, "docx": write_docx, "csv": write_csv, "xlsx": write_xlsx}
+
+
+def generate_corpus(out_dir, n_controls=200, n_regulations=800, formats=FORMATS, seed=42):
+    # Returns {"controls": {fmt: path}, "regulations": {fmt: path}, "sizes": {...}}
+    os.makedirs(out_dir, exist_ok=True)
+    controls = make_clauses(n_controls, seed)
+    regulations = make_clauses(n_regulations, seed + 1)
+
+    corpus = {"controls": {}, "regulations": {}, "sizes": {"controls": n_controls, "regulations": n_regulations}}
+    for fmt in formats:
+        control_path = os.path.join(out_dir, f"CONTROLS_synthetic.{fmt}")
+        # File names carry a known regulation so infer_source_type tags them correctly
+        regulation_path = os.path.join(out_dir, f"{REGULATIONS[FORMATS.index(fmt) % len(REGULATIONS)]}_synthetic.{fmt}")
+        WRITERS[fmt](control_path, controls)
+        WRITERS[fmt](regulation_path, regulations)
+        corpus["controls"][fmt] = control_path
+        corpus["regulations"][fmt] = regulation_path
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic compliance corpus.")
+    parser.add_argument("--controls", type=int, default=200)
+    parser.add_argument("--regulations", type=int, default=800)
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=FORMATS)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=os.path.join("data", "bench_corpus"))
+    args = parser.parse_args()
+
+    corpus = generate_corpus(args.out, args.controls, args.regulations, args.formats, args.seed)
+    for kind in ("controls", "regulations"):
+        for fmt, path in corpus[kind].items():
+            print(f"{kind:>12}  {fmt:>5}  {path}")
+
+
+if __name__ == "__main__":
+    main()
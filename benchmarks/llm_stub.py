@@ -0,0 +1,142 @@
+# benchmarks/llm_stub.py
+#
+# Local OpenAI-compatible chat completions server with configurable latency and error rate.
+# Usage: python benchmarks/llm_stub.py --port 8099 --latency 0.5 --error-rate 0.1
+#        GROQ_BASE_URL=http://127.0.0.1:8099/v1 streamlit run app/dashboard.py
+
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_ANALYSIS = (
+    "Classify: Partial match between the control and the regulation clause.\n"
+    "Overlap: encryption, access review, personal data\n"
+    "Gap: retention period and breach notification timeline are not covered\n"
+    "Rewrite: Encrypt personal data at rest, review access quarterly and notify breaches within 72 hours.\n"
+    "Risk: Regulatory action for inadequate safeguards\n"
+    "Fine: Medium - partial coverage of mandatory safeguards"
+)
+
+
+class StubConfig:
+    def __init__(self, latency=0.2, jitter=0.05, error_rate=0.0, error_status=429, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0}
+
+    def draw(self):
+        # Returns (delay, should_fail) under a lock so seeded runs stay reproducible
+        with self.lock:
+            self.stats["requests"] += 1
+            delay = max(self.latency + self.rng.uniform(-self.jitter, self.jitter), 0.0)
+            fail = self.rng.random() < self.error_rate
+            if fail:
+                self.stats["errors"] += 1
+        return delay, fail
+
+
+def make_handler(config):
+    class StubHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status, payload, headers=None):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+                return
+
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            delay, fail = config.draw()
+            time.sleep(delay)
+
+            if fail:
+                message = "Too Many Requests" if config.error_status == 429 else "Stub server error"
+                self.send_json(config.error_status, {"error": {"message": message, "type": "stub_error"}},
+                               {"Retry-After": "1"} if config.error_status == 429 else None)
+                return
+
+            created = int(time.time())
+            model = request.get("model", "stub-model")
+            if request.get("stream"):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                for word in CANNED_ANALYSIS.split(" "):
+                    chunk = {
+                        "id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": created, "model": model,
+                        "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                done = {
+                    "id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+                }
+                self.wfile.write(f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+                return
+
+            self.send_json(200, {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": CANNED_ANALYSIS},
+                    "finish_reason": "stop"
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(CANNED_ANALYSIS.split()), "total_tokens": 0}
+            })
+
+    return StubHandler
+
+
+def start_stub_server(config=None, host="127.0.0.1", port=0):
+    # Returns (server, base_url); the server runs on a daemon thread until server.shutdown()
+    config = config or StubConfig()
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    server.config = config
+    threading.Thread(target=server.serve_forever, name="llm-stub", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible LLM stub server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.2, help="Mean response latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=429)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    config = StubConfig(args.latency, args.jitter, args.error_rate, args.error_status, args.seed)
+    server, base_url = start_stub_server(config, args.host, args.port)
+    print(f"LLM stub listening on {base_url} (latency {args.latency}s, error rate {args.error_rate})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+# benchmarks/run_benchmarks.py
+#
+# End-to-end pipeline benchmark: extraction, encoding, similarity, LLM analysis and report generation.
+# The LLM stage runs against the local stub in benchmarks/llm_stub.py, never the real API.
+# Usage: python benchmarks/run_benchmarks.py --controls 500 --regulations 2000 --json bench.json
+#        python benchmarks/run_benchmarks.py --json new.json --compare bench.json
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Add project root and this folder to sys.path
+ROOT = Path(__file__).parent.parent.resolve()
+sys.path.append(str(ROOT))
+sys.path.append(str(Path(__file__).parent.resolve()))
+
+from corpus import FORMATS, generate_corpus
+from llm_stub import StubConfig, start_stub_server
+
+
+# --- Helpers ---
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def latency_summary(latencies):
+    if not latencies:
+        return {"count": 0}
+    values = np.array(latencies) * 1000
+    return {
+        "count": len(values),
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "max_ms": round(float(values.max()), 2),
+    }
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+# --- Stages ---
+def bench_extraction(document_parser, corpus):
+    stage, clauses = {}, {}
+    for kind in ("controls", "regulations"):
+        for fmt, path in corpus[kind].items():
+            extracted, seconds = timed(document_parser.extract_text, path)
+            stage[f"{kind}_{fmt}"] = {"seconds": round(seconds, 4), "clauses": len(extracted)}
+            clauses.setdefault(kind, extracted)
+    return stage, clauses
+
+def bench_encoding(match_engine, control_texts, reg_texts):
+    reg_emb, reg_seconds = timed(match_engine.model.encode, reg_texts, convert_to_tensor=True, show_progress_bar=False)
+    ctl_emb, ctl_seconds = timed(match_engine.model.encode, control_texts, convert_to_tensor=True, show_progress_bar=False)
+    total = reg_seconds + ctl_seconds
+    stage = {
+        "seconds": round(total, 4),
+        "regulation_seconds": round(reg_seconds, 4),
+        "control_seconds": round(ctl_seconds, 4),
+        "clauses_per_second": round((len(reg_texts) + len(control_texts)) / total, 1) if total else None,
+    }
+    return stage, ctl_emb, reg_emb
+
+def bench_similarity(match_engine, ctl_emb, reg_emb):
+    def score():
+        sims = match_engine.util.cos_sim(ctl_emb, reg_emb).cpu().numpy()
+        return sims.argmax(axis=1), sims.max(axis=1)
+    (best_idx, best_scores), seconds = timed(score)
+    stage = {"seconds": round(seconds, 4), "pairs": int(ctl_emb.shape[0] * reg_emb.shape[0])}
+    return stage, best_idx, best_scores
+
+def bench_llm(match_engine, pairs, workers):
+    latencies, errors = [], 0
+
+    def call(pair):
+        control, regulation, score = pair
+        reply, seconds = timed(match_engine.generate_llama_analysis, control, regulation, score, "GDPR")
+        return reply, seconds
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for reply, seconds in executor.map(call, pairs):
+            latencies.append(seconds)
+            if reply.startswith("[LLaMA Error"):
+                errors += 1
+    seconds = time.perf_counter() - start
+    return {"seconds": round(seconds, 4), "workers": workers, "errors": errors, **latency_summary(latencies)}
+
+def bench_reports(report_builder, matched, missing, out_dir):
+    stage = {}
+    writers = {
+        "xlsx": report_builder.write_excel_report,
+        "csv": report_builder.write_csv_report,
+        "parquet": report_builder.write_parquet_report,
+    }
+    for fmt, writer in writers.items():
+        path = os.path.join(out_dir, f"report.{fmt}")
+        try:
+            _, seconds = timed(writer, matched, missing, path)
+            stage[fmt] = {"seconds": round(seconds, 4), "file_kb": os.path.getsize(path) // 1024}
+        except ImportError as e:
+            stage[fmt] = {"skipped": str(e)}
+    return stage
+
+def bench_end_to_end(match_engine, control_clauses, regulation_clauses, llm_clauses):
+    match_engine.MAX_LLaMA_ANALYSIS = llm_clauses
+    results, seconds = timed(match_engine.process_and_match_multiple_docs, control_clauses, regulation_clauses)
+    return {"seconds": round(seconds, 4), "results": len(results), "llm_clauses": llm_clauses}
+
+
+# --- Runner ---
+def run(args):
+    stub_config = StubConfig(args.llm_latency, args.llm_jitter, args.llm_error_rate, seed=args.seed)
+    server, base_url = start_stub_server(stub_config)
+    os.environ["GROQ_BASE_URL"] = base_url
+    os.environ.setdefault("GROQ_API_KEY", "benchmark-stub")
+
+    # Imported after the environment is set so the matcher points at the stub
+    from api import document_parser, match_engine, report_builder, metrics
+    metrics.set_enabled(args.metrics)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": vars(args),
+        },
+        "stages": {},
+    }
+    stages = report["stages"]
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            corpus, seconds = timed(generate_corpus, os.path.join(tmp, "corpus"),
+                                    args.controls, args.regulations, args.formats, args.seed)
+            stages["corpus"] = {"seconds": round(seconds, 4), **corpus["sizes"]}
+
+            stages["extraction"], clauses = bench_extraction(document_parser, corpus)
+            control_clauses = clauses["controls"]
+            regulation_clauses = [{"text": c["text"], "regulation": c["doc_name"]} for c in clauses["regulations"]]
+            control_texts = [match_engine.clean_text(c["text"]) for c in control_clauses]
+            reg_texts = [match_engine.clean_text(c["text"]) for c in regulation_clauses]
+
+            stages["encoding"], ctl_emb, reg_emb = bench_encoding(match_engine, control_texts, reg_texts)
+            stages["similarity"], best_idx, best_scores = bench_similarity(match_engine, ctl_emb, reg_emb)
+
+            pairs = [
+                (control_texts[i], reg_texts[best_idx[i]], float(best_scores[i]))
+                for i in range(min(args.llm_calls, len(control_texts)))
+            ]
+            stages["llm"] = bench_llm(match_engine, pairs, args.llm_workers)
+
+            raw_results = [{
+                "control_id": control_clauses[i]["clause_id"],
+                "control": control_texts[i],
+                "status": match_engine.classify_status(float(best_scores[i])),
+                "score": round(float(best_scores[i]), 3),
+                "regulation": regulation_clauses[best_idx[i]]["regulation"],
+            } for i in range(len(control_texts))]
+            matched, missing = match_engine.split_match_results(raw_results)
+            stages["report"] = bench_reports(report_builder, matched, missing, tmp)
+
+            if not args.skip_e2e:
+                stages["end_to_end"] = bench_end_to_end(
+                    match_engine, control_clauses[:args.e2e_controls], regulation_clauses, args.e2e_llm_clauses
+                )
+    finally:
+        server.shutdown()
+
+    report["meta"]["stub"] = dict(stub_config.stats)
+    if args.metrics:
+        report["metrics"] = metrics.snapshot()
+    return report
+
+
+# --- Comparison ---
+def flatten_seconds(stages, prefix=""):
+    out = {}
+    for key, value in stages.items():
+        if isinstance(value, dict):
+            if "seconds" in value:
+                out[f"{prefix}{key}"] = value["seconds"]
+            out.update(flatten_seconds({k: v for k, v in value.items() if isinstance(v, dict)}, f"{prefix}{key}."))
+    return out
+
+def print_comparison(baseline, current):
+    base, new = flatten_seconds(baseline["stages"]), flatten_seconds(current["stages"])
+    print(f"\n{'stage':<36}{'baseline s':>12}{'current s':>12}{'change':>10}")
+    for key in sorted(set(base) & set(new)):
+        change = f"{(new[key] - base[key]) / base[key] * 100:+.1f}%" if base[key] else "—"
+        print(f"{key:<36}{base[key]:>12.4f}{new[key]:>12.4f}{change:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the compliance matching pipeline.")
+    parser.add_argument("--controls", type=int, default=200)
+    parser.add_argument("--regulations", type=int, default=800)
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=FORMATS)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--llm-calls", type=int, default=20)
+    parser.add_argument("--llm-workers", type=int, default=4)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Stub mean latency in seconds")
+    parser.add_argument("--llm-jitter", type=float, default=0.05)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--e2e-controls", type=int, default=50)
+    parser.add_argument("--e2e-llm-clauses", type=int, default=3)
+    parser.add_argument("--skip-e2e", action="store_true")
+    parser.add_argument("--metrics", action="store_true", help="Also record per-stage pipeline metrics")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON file from an earlier run")
+    args = parser.parse_args()
+
+    report = run(args)
+    print(json.dumps(report["stages"], indent=2))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()